@@ -1,13 +1,56 @@
 import streamlit as st
 import soundfile as sf
 import tempfile
+import collections
+import concurrent.futures
 import os
+import re
 import time
 from datetime import datetime
+import numpy as np
+import onnxruntime as ort
 from kokoro_onnx import Kokoro
 import zipfile
 import io
 
+
+def _make_session(model_path: str) -> ort.InferenceSession:
+    """Build an InferenceSession tuned for a single-user CPU Streamlit host.
+
+    One request runs at a time, so a single-threaded sequential session keeps
+    RSS low and predictable without measurably slowing the small Kokoro-82M
+    model. The CPU memory arena is kept but shrunk after every run (see
+    below), so memory grown during a long generation is returned to the OS
+    instead of accumulating over the life of the Streamlit worker.
+    """
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = 1
+    sess_opts.inter_op_num_threads = 1
+    sess_opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    sess_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    sess_opts.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    # Keep the model weights out of the arena so shrinking it never has to
+    # work around pinned initializer allocations.
+    sess_opts.add_session_config_entry("session.use_device_allocator_for_initializers", "1")
+    session = ort.InferenceSession(model_path, sess_options=sess_opts)
+
+    # kokoro_onnx calls session.run() without RunOptions, so patch in a
+    # default that shrinks the CPU arena after each inference. No locking:
+    # sessions are thread-safe for concurrent Run(), which is how Batch-mode
+    # workers scale with intra-op pinned to one thread. (IOBinding with
+    # pre-allocated output buffers was tried here and dropped - the waveform
+    # length is data-dependent, so outputs cannot be pre-sized and binding
+    # adds nothing over plain run for CPU-resident tensors.)
+    run_opts = ort.RunOptions()
+    run_opts.add_run_config_entry("memory.enable_memory_arena_shrinkage", "cpu:0")
+    original_run = session.run
+
+    def run_with_shrinkage(output_names, input_feed, run_options=None):
+        return original_run(output_names, input_feed, run_options or run_opts)
+
+    session.run = run_with_shrinkage
+    return session
+
 # Page configuration
 st.set_page_config(
     page_title="Kokoro Voice Generator",
@@ -15,16 +58,145 @@ st.set_page_config(
     layout="wide"
 )
 
+# Kokoro-82M always emits 24kHz audio
+SAMPLE_RATE = 24000
+
+# Worker cap for Batch mode: inference and WAV encode/disk I/O overlap here
+_BATCH_WORKERS = min(4, os.cpu_count() or 1)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def text_stats(text: str, speed: float) -> tuple[int, int, float]:
+    """Character count, word count, and estimated duration for the stats row.
+
+    Uses re.finditer so counting words never materializes a list of
+    substrings (text.split() on a large paste did, on every keystroke),
+    and caches per (text, speed) since reruns mostly see unchanged text.
+    """
+    word_count = sum(1 for _ in re.finditer(r"\S+", text))
+    # Rough estimate: ~150 words per minute for average speech
+    estimated_duration = (word_count / 150) * 60 / speed if word_count > 0 else 0
+    return len(text), word_count, estimated_duration
+
+
+def chunk_text(text, max_words=40):
+    """Split text into sentence-aligned chunks of at most max_words words.
+
+    Long pastes would otherwise hit the model with sequences far past its
+    efficient length, inflating per-call attention memory. Sentences are
+    grouped greedily up to the word budget; a single sentence longer than
+    the budget stays intact (Kokoro splits over-long phoneme runs itself).
+    """
+    sentences = re.split(r"(?<=[.!?。！？])\s+", text.strip())
+    chunks = []
+    current = []
+    count = 0
+    for sentence in sentences:
+        words = len(sentence.split())
+        if current and count + words > max_words:
+            chunks.append(" ".join(current))
+            current = []
+            count = 0
+        current.append(sentence)
+        count += words
+    if current:
+        chunks.append(" ".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def synth_wav(text: str, voice: str, speed: float, lang: str) -> tuple[bytes, int]:
+    """Memoized synthesis: identical (text, voice, speed, lang) requests -
+    repeated previews, template sentences, re-generated chunks - return the
+    stored clip without touching the phonemizer or the ONNX session. Only
+    the encoded WAV (16-bit PCM) is cached - a quarter the size of the raw
+    float32 waveform - so the cache stays small on constrained hosts."""
+    samples, sample_rate = get_kokoro().create(text, voice=voice, speed=speed, lang=lang)
+    buf = io.BytesIO()
+    sf.write(buf, samples, sample_rate, format="WAV")
+    return buf.getvalue(), sample_rate
+
+
+def _synth_samples(text: str, voice: str, speed: float, lang: str):
+    """Cached synthesis for callers that need raw samples (the chunk loop).
+
+    Decodes synth_wav's cached bytes rather than keeping a second cache of
+    float32 waveforms; the decode is orders of magnitude cheaper than an
+    ORT run."""
+    wav_bytes, sample_rate = synth_wav(text, voice, speed, lang)
+    samples, _ = sf.read(io.BytesIO(wav_bytes), dtype="float32")
+    return samples, sample_rate
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _read_bytes(path: str, mtime: float) -> bytes:
+    """Cached file read for the History tab, keyed on (path, mtime).
+
+    Streamlit re-executes the script on every widget interaction, which
+    re-read every history WAV from disk each time; with the mtime in the
+    key a rerun costs one stat per entry instead of a full read.
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _stream_generate(text, voice, speed, lang, on_chunk=None, on_progress=None):
+    """Generate audio chunk-by-chunk, reporting audio as it arrives.
+
+    Splits the text into sentence-bounded chunks (bounding per-call memory),
+    synthesizes each in turn, and calls on_chunk(samples_so_far, sample_rate)
+    after every chunk so the caller can start playback long before the full
+    clip is synthesized. on_progress(done, total) tracks chunk completion.
+    Returns (samples, sample_rate) for the complete clip.
+    """
+    chunks = chunk_text(text)
+    parts = []
+    sample_rate = SAMPLE_RATE
+    for i, chunk in enumerate(chunks):
+        samples, sample_rate = _synth_samples(chunk, voice, speed, lang)
+        parts.append(samples)
+        if on_chunk is not None:
+            on_chunk(np.concatenate(parts), sample_rate)
+        if on_progress is not None:
+            on_progress(i + 1, len(chunks))
+    return np.concatenate(parts), sample_rate
+
+
+@st.cache_resource(show_spinner="Loading Kokoro model...")
+def get_kokoro() -> Kokoro:
+    """Load the Kokoro model once per process and share it across sessions."""
+    base_dir = os.path.abspath(os.path.dirname(__file__))
+    # Prefer the variants produced by the launcher: .ort loads fastest
+    # (no protobuf parsing), FP16 halves RSS; the FP32 .onnx download is
+    # the guaranteed fallback.
+    for model_name in (
+        "kokoro-v1.0.fp16.ort",
+        "kokoro-v1.0.ort",
+        "kokoro-v1.0.fp16.onnx",
+        "kokoro-v1.0.onnx",
+    ):
+        model_path = os.path.join(base_dir, "model", model_name)
+        if os.path.exists(model_path):
+            break
+    voices_path = os.path.join(base_dir, "model", "voices-v1.0.bin")
+    kokoro = Kokoro.from_session(_make_session(model_path), voices_path)
+    # Tiny warmup inference so the first real request skips ORT's lazy
+    # kernel setup and initial arena growth. Best-effort: a warmup failure
+    # must never block startup.
+    try:
+        kokoro.create("a", voice="af_heart", speed=1.0, lang="en-us")
+    except Exception:
+        pass
+    return kokoro
+
+
 # Initialize session state
-if 'kokoro' not in st.session_state:
-    with st.spinner("Loading Kokoro model..."):
-        base_dir = os.path.abspath(os.path.dirname(__file__))
-        model_path = os.path.join(base_dir, "model", "kokoro-v1.0.onnx")
-        voices_path = os.path.join(base_dir, "model", "voices-v1.0.bin")
-        st.session_state.kokoro = Kokoro(model_path, voices_path)
+# Bounded: only the newest HISTORY_LIMIT generations are kept, so history
+# memory stays constant instead of growing with every generation.
+HISTORY_LIMIT = 10
 
 if 'audio_history' not in st.session_state:
-    st.session_state.audio_history = []
+    st.session_state.audio_history = collections.deque(maxlen=HISTORY_LIMIT)
 
 if 'presets' not in st.session_state:
     st.session_state.presets = {}
@@ -91,6 +263,19 @@ VOICES_BY_LANGUAGE = {
         },
 }
 
+# Flat per-voice metadata derived once at import: voice id -> (lang_code,
+# gender, language name). Streamlit reruns the whole script on every widget
+# change, so lookups stay O(1) instead of re-scanning the nested dicts and
+# prefix tuples per rerun.
+VOICE_META = {}
+for _language_name, _info in VOICES_BY_LANGUAGE.items():
+    for _voice_id in _info["voices"]:
+        # Every Kokoro-82M voice id follows <lang><f|m>_<name>, so gender is
+        # just the second character - no prefix chain needed.
+        assert len(_voice_id) > 2 and _voice_id[1] in ("f", "m") and _voice_id[2] == "_", _voice_id
+        _gender = "F" if _voice_id[1] == "f" else "M"
+        VOICE_META[_voice_id] = (_info["lang_code"], _gender, _language_name)
+
 # Text templates
 TEXT_TEMPLATES = {
     "Greeting": "Hello! Welcome to Kokoro Voice Generator.",
@@ -137,7 +322,7 @@ with st.sidebar:
     )
     
     # Show voice info
-    gender_emoji = "🚺" if selected_voice.startswith(("af_", "bf_", "jf_", "zf_", "ef_", "ff_", "hf_", "if_", "pf_")) else "🚹"
+    gender_emoji = "🚺" if VOICE_META[selected_voice][1] == "F" else "🚹"
     st.caption(f"Voice: {gender_emoji} {selected_voice}")
     
     # Speed control
@@ -222,11 +407,8 @@ with tab1:
 
         # Text statistics below the button
         if text_input:
-            char_count = len(text_input)
-            word_count = len(text_input.split())
-            # Rough estimate: ~150 words per minute for average speech
-            estimated_duration = (word_count / 150) * 60 / speed if word_count > 0 else 0
-            
+            char_count, word_count, estimated_duration = text_stats(text_input, speed)
+
             stat_col1, stat_col2, stat_col3 = st.columns(3)
             with stat_col1:
                 st.metric("Characters", char_count)
@@ -242,24 +424,49 @@ with tab1:
             else:
                 try:
                     start_time = time.time()
-                    with st.spinner("Generating audio... This may take a moment."):
-                        # Generate audio
-                        samples, sample_rate = st.session_state.kokoro.create(
+                    player = st.empty()
+                    chunk_progress = st.empty()
+                    with st.spinner("Generating audio... Partial audio is playable below as chunks complete."):
+                        # Generate audio chunk-by-chunk, refreshing the player
+                        # after every chunk so the partial clip can be played
+                        # without waiting for the whole generation. Each update
+                        # replaces the widget, so playback neither autostarts
+                        # nor survives an update - the copy must not promise
+                        # more than that.
+                        def on_chunk(samples_so_far, sample_rate):
+                            chunk_buf = io.BytesIO()
+                            sf.write(chunk_buf, samples_so_far, sample_rate, format="WAV")
+                            player.audio(chunk_buf.getvalue(), format="audio/wav")
+
+                        def on_progress(done, total):
+                            if total > 1:
+                                chunk_progress.progress(done / total)
+
+                        samples, sample_rate = _stream_generate(
                             text_input,
-                            voice=selected_voice,
-                            speed=speed,
-                            lang=current_lang_code
+                            selected_voice,
+                            speed,
+                            current_lang_code,
+                            on_chunk=on_chunk,
+                            on_progress=on_progress
                         )
-                        
+                        chunk_progress.empty()
+
                         generation_time = time.time() - start_time
                         duration = len(samples) / sample_rate
-                        
-                        # Save to temporary file
+
+                        # Encode once in memory for the player and download
+                        # button; only the History tab needs a file on disk.
+                        wav_buf = io.BytesIO()
+                        sf.write(wav_buf, samples, sample_rate, format="WAV")
+                        wav_bytes = wav_buf.getvalue()
+
                         with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-                            sf.write(tmp_file.name, samples, sample_rate)
+                            tmp_file.write(wav_bytes)
                             tmp_file_path = tmp_file.name
-                        
-                        # Save to history
+
+                        # Save to history, unlinking the temp file of the
+                        # entry the bounded deque is about to evict.
                         audio_data = {
                             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                             "text": text_input[:100] + "..." if len(text_input) > 100 else text_input,
@@ -267,28 +474,27 @@ with tab1:
                             "language": selected_language,
                             "speed": speed,
                             "duration": duration,
-                            "file_path": tmp_file_path,
-                            "samples": samples,
-                            "sample_rate": sample_rate
+                            "file_path": tmp_file_path
                         }
-                        st.session_state.audio_history.insert(0, audio_data)
-                        
-                        # Display audio player
+                        history = st.session_state.audio_history
+                        if len(history) == HISTORY_LIMIT:
+                            evicted = history[-1]
+                            if os.path.exists(evicted["file_path"]):
+                                os.unlink(evicted["file_path"])
+                        history.appendleft(audio_data)
+
                         st.success("✅ Audio generated successfully!")
-                        st.audio(tmp_file_path, format="audio/wav")
-                        
+
                         # Download buttons
                         col1, col2 = st.columns(2)
                         with col1:
-                            with open(tmp_file_path, "rb") as audio_file:
-                                audio_bytes = audio_file.read()
-                                st.download_button(
-                                    label="⬇️ Download WAV",
-                                    data=audio_bytes,
-                                    file_name=f"kokoro_{selected_voice}_{int(time.time())}.wav",
-                                    mime="audio/wav",
-                                    use_container_width=True
-                                )
+                            st.download_button(
+                                label="⬇️ Download WAV",
+                                data=wav_bytes,
+                                file_name=f"kokoro_{selected_voice}_{int(time.time())}.wav",
+                                mime="audio/wav",
+                                use_container_width=True
+                            )
                         
                         # Display info
                         info_col1, info_col2, info_col3 = st.columns(3)
@@ -324,28 +530,43 @@ with tab1:
                 
                 audio_files = []
                 errors = []
-                
-                for i, text in enumerate(texts):
-                    status_text.text(f"Processing {i+1}/{len(texts)}: {text[:50]}...")
-                    progress_bar.progress((i + 1) / len(texts))
-                    
-                    try:
-                        samples, sample_rate = st.session_state.kokoro.create(
-                            text,
-                            voice=selected_voice,
-                            speed=speed,
-                            lang=current_lang_code
-                        )
-                        
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-                            sf.write(tmp_file.name, samples, sample_rate)
-                            audio_files.append({
-                                "text": text[:50],
-                                "file": tmp_file.name,
-                                "name": f"batch_{i+1}_{selected_voice}_{int(time.time())}.wav"
-                            })
-                    except Exception as e:
-                        errors.append(f"Text {i+1}: {str(e)}")
+
+                # One task per line: generate, then encode/flush the WAV in
+                # the same worker, so item k+1's inference overlaps item k's
+                # disk write. Kokoro's duration predictor makes clip lengths
+                # data-dependent, so per-text create calls (which also keep
+                # MAX_PHONEME_LENGTH splitting) are the unit of work here.
+                def gen_one(i, text):
+                    samples, sample_rate = get_kokoro().create(
+                        text,
+                        voice=selected_voice,
+                        speed=speed,
+                        lang=current_lang_code
+                    )
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
+                        sf.write(tmp_file.name, samples, sample_rate)
+                        return {
+                            "text": text[:50],
+                            "file": tmp_file.name,
+                            "name": f"batch_{i+1}_{selected_voice}_{int(time.time())}.wav"
+                        }
+
+                done = 0
+                generated = []
+                with concurrent.futures.ThreadPoolExecutor(max_workers=_BATCH_WORKERS) as pool:
+                    futures = {
+                        pool.submit(gen_one, i, text): i
+                        for i, text in enumerate(texts)
+                    }
+                    for future in concurrent.futures.as_completed(futures):
+                        done += 1
+                        status_text.text(f"Processing {done}/{len(texts)}...")
+                        progress_bar.progress(done / len(texts))
+                        try:
+                            generated.append((futures[future], future.result()))
+                        except Exception as e:
+                            errors.append(f"Text {futures[future]+1}: {str(e)}")
+                audio_files = [audio_file for _, audio_file in sorted(generated)]
                 
                 status_text.empty()
                 progress_bar.empty()
@@ -366,7 +587,10 @@ with tab1:
                     # Batch download as ZIP
                     if len(audio_files) > 1:
                         zip_buffer = io.BytesIO()
-                        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                        # PCM WAV barely deflates (~5-10%) but pays full
+                        # deflate CPU; store uncompressed so zipping a large
+                        # batch is I/O-bound instead of dominating wall time.
+                        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_STORED) as zip_file:
                             for audio_file in audio_files:
                                 zip_file.write(audio_file["file"], audio_file["name"])
                                 os.unlink(audio_file["file"])
@@ -400,17 +624,10 @@ with tab1:
             else:
                 try:
                     with st.spinner("Generating preview..."):
-                        samples, sample_rate = st.session_state.kokoro.create(
-                            preview_text,
-                            voice=selected_voice,
-                            speed=speed,
-                            lang=current_lang_code
+                        wav_bytes, sample_rate = synth_wav(
+                            preview_text, selected_voice, speed, current_lang_code
                         )
-                        
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp_file:
-                            sf.write(tmp_file.name, samples, sample_rate)
-                            st.audio(tmp_file.name, format="audio/wav")
-                            os.unlink(tmp_file.name)
+                        st.audio(wav_bytes, format="audio/wav")
                 except Exception as e:
                     st.error(f"❌ Error: {str(e)}")
 
@@ -437,25 +654,25 @@ with tab3:
             for item in st.session_state.audio_history:
                 if os.path.exists(item["file_path"]):
                     os.unlink(item["file_path"])
-            st.session_state.audio_history = []
+            st.session_state.audio_history.clear()
             st.rerun()
-        
-        for idx, item in enumerate(st.session_state.audio_history[:10]):  # Show last 10
+
+        for idx, item in enumerate(st.session_state.audio_history):
             with st.expander(f"🎵 {item['timestamp']} - {item['voice']} ({item['language']})"):
                 col1, col2 = st.columns([2, 1])
                 with col1:
                     st.text(f"Text: {item['text']}")
                     st.caption(f"Speed: {item['speed']}x | Duration: {item['duration']:.2f}s")
                     if os.path.exists(item["file_path"]):
-                        st.audio(item["file_path"], format="audio/wav")
-                        with open(item["file_path"], "rb") as f:
-                            st.download_button(
-                                label="⬇️ Download",
-                                data=f.read(),
-                                file_name=f"kokoro_{item['voice']}_{idx}.wav",
-                                mime="audio/wav",
-                                key=f"hist_dl_{idx}"
-                            )
+                        wav_bytes = _read_bytes(item["file_path"], os.path.getmtime(item["file_path"]))
+                        st.audio(wav_bytes, format="audio/wav")
+                        st.download_button(
+                            label="⬇️ Download",
+                            data=wav_bytes,
+                            file_name=f"kokoro_{item['voice']}_{idx}.wav",
+                            mime="audio/wav",
+                            key=f"hist_dl_{idx}"
+                        )
                     else:
                         st.warning("Audio file no longer available")
 